@@ -106,6 +106,8 @@ class SubjectSession:
     how_many: int
     sgr: str = ''
     room: Room = None
+    profile: str = ''
+    teacher: str = ''
 
     def render(self):
         name = '\n'.join(textwrap.wrap(self.name, width=22))
@@ -0,0 +1,462 @@
+from __future__ import annotations
+
+import json
+import random
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from ortools.sat.python import cp_model
+
+from entity import Room, StudentsGroup, SubjectGroup, SubjectSession, Timeslot, TimeSlotScorer
+
+WEEK_DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+HOUR_BLOCKS = [8, 10, 12, 14, 16, 18]
+NEIGHBORHOODS = ("day", "profile", "room_type", "teacher")
+
+UNASSIGNED_PENALTY = 1000  # per session that could not be placed
+GAP_PENALTY = 2  # per idle 2h block between two sessions of a semigroup
+
+# session_idx -> (room_idx, timeslot_idx), or None when the session is unplaced
+Assignment = Dict[int, Optional[Tuple[int, int]]]
+
+
+def build_timeslots() -> List[Timeslot]:
+    return [Timeslot(day, hour) for day in WEEK_DAYS for hour in HOUR_BLOCKS]
+
+
+def parse_assistants(prof_asistenti: str) -> List[str]:
+    """Expand the assistants into one entry per group they take.
+
+    The number after each name is that assistant's share of the practice groups:
+    "Marian Socoliuc(1), Gabriela Cosmulese(2)," -> ["Marian Socoliuc", "Gabriela Cosmulese", "Gabriela Cosmulese"]
+    A name without a number takes a single group.
+    """
+    assistants = []
+    for entry in prof_asistenti.split(","):
+        match = re.fullmatch(r"\s*(.*?)\s*(?:\((\d+)\))?\s*", entry)
+        name, share = match.group(1), match.group(2)
+        if name:
+            assistants += [name] * (int(share) if share else 1)
+    return assistants
+
+
+@dataclass
+class TimetableProblem:
+    sessions: List[SubjectSession]
+    rooms: List[Room]
+    semigroups: Dict[str, List[str]]
+    timeslots: List[Timeslot] = field(default_factory=build_timeslots)
+    scorer: TimeSlotScorer = field(default_factory=TimeSlotScorer)
+    audiences: List[List[str]] = field(init=False)
+    eligible_rooms: List[List[int]] = field(init=False)
+    slot_penalty: List[List[int]] = field(init=False)
+
+    def __post_init__(self):
+        self.audiences = []
+        self.eligible_rooms = []
+        self.slot_penalty = []
+
+        for session in self.sessions:
+            # Courses are attended by every semigroup of the specialization-year
+            sgrs = session.sgr.split(", ") if session.sgr else self.semigroups[session.profile]
+            self.audiences.append([f"{session.profile}_{sgr}" for sgr in sgrs])
+
+            # Best fit first, so large rooms stay free for large sessions
+            rooms = [
+                r_idx for r_idx, room in enumerate(self.rooms)
+                if room.scop == session.type and room.nr_locuri >= session.how_many
+            ]
+            rooms.sort(key=lambda r_idx: self.rooms[r_idx].nr_locuri)
+            self.eligible_rooms.append(rooms)
+
+            best = max(self.scorer.get_score(session.type, hour) for hour in HOUR_BLOCKS)
+            self.slot_penalty.append([
+                best - self.scorer.get_score(session.type, timeslot.start_hour)
+                for timeslot in self.timeslots
+            ])
+
+    @classmethod
+    def from_groups(cls, students_group: StudentsGroup, subject_group: SubjectGroup, rooms: List[Room]):
+        sessions: List[SubjectSession] = []
+        semigroups: Dict[str, List[str]] = {}
+
+        for student in students_group.students:
+            profile_name = f"{student.nume_specializare} {student.an_studiu}"
+            semigroups[profile_name] = [f"sgr:{i + 1}" for i in range(student.nr_semigrupe)]
+
+            for subject in subject_group.get_for_students(profile_name):
+                assistants = parse_assistants(subject.prof_asistenti) or [subject.prof_titular]
+                group_teachers: Dict[str, str] = {}
+                for session in subject.get_sessions(student, rooms):
+                    session.profile = profile_name
+                    if session.type == "curs":
+                        session.teacher = subject.prof_titular
+                    else:
+                        # Practice groups (a semigroup pair, or a single semigroup) are handed out in
+                        # order by share; all sessions of a group keep the same assistant. When a subject
+                        # has more groups than listed shares, the extra groups start over from the top.
+                        if session.sgr not in group_teachers:
+                            group_teachers[session.sgr] = assistants[len(group_teachers) % len(assistants)]
+                        session.teacher = group_teachers[session.sgr]
+                    sessions.append(session)
+
+        return cls(sessions, rooms, semigroups)
+
+    def day_of(self, t_idx: int) -> str:
+        return self.timeslots[t_idx].day
+
+    def greedy(self) -> Assignment:
+        assignment: Assignment = {}
+        used_rooms: Set[Tuple[int, int]] = set()
+        used_audiences: Set[Tuple[str, int]] = set()
+        used_teachers: Set[Tuple[str, int]] = set()
+
+        # Most constrained sessions first: few rooms, many semigroups, many students
+        order = sorted(
+            range(len(self.sessions)),
+            key=lambda s_idx: (
+                len(self.eligible_rooms[s_idx]),
+                -len(self.audiences[s_idx]),
+                -self.sessions[s_idx].how_many,
+            )
+        )
+
+        for s_idx in order:
+            assignment[s_idx] = None
+            slots = sorted(range(len(self.timeslots)), key=lambda t_idx: self.slot_penalty[s_idx][t_idx])
+            for t_idx in slots:
+                if any((aud, t_idx) in used_audiences for aud in self.audiences[s_idx]):
+                    continue
+                if self.sessions[s_idx].teacher and (self.sessions[s_idx].teacher, t_idx) in used_teachers:
+                    continue
+                r_idx = next((r for r in self.eligible_rooms[s_idx] if (r, t_idx) not in used_rooms), None)
+                if r_idx is None:
+                    continue
+                assignment[s_idx] = (r_idx, t_idx)
+                used_rooms.add((r_idx, t_idx))
+                used_audiences.update((aud, t_idx) for aud in self.audiences[s_idx])
+                if self.sessions[s_idx].teacher:
+                    used_teachers.add((self.sessions[s_idx].teacher, t_idx))
+                break
+
+        return assignment
+
+    def is_valid_placement(self, placement) -> bool:
+        return (
+            isinstance(placement, (list, tuple)) and len(placement) == 2 and
+            all(isinstance(idx, int) and not isinstance(idx, bool) for idx in placement) and
+            0 <= placement[0] < len(self.rooms) and
+            0 <= placement[1] < len(self.timeslots)
+        )
+
+    def is_feasible(self, assignment: Assignment) -> bool:
+        used_rooms: Set[Tuple[int, int]] = set()
+        used_audiences: Set[Tuple[str, int]] = set()
+        used_teachers: Set[Tuple[str, int]] = set()
+
+        for s_idx in range(len(self.sessions)):
+            placement = assignment.get(s_idx)
+            if placement is None:
+                continue
+            if not self.is_valid_placement(placement):
+                return False
+            r_idx, t_idx = placement
+            if r_idx not in self.eligible_rooms[s_idx] or (r_idx, t_idx) in used_rooms:
+                return False
+            used_rooms.add((r_idx, t_idx))
+            for aud in self.audiences[s_idx]:
+                if (aud, t_idx) in used_audiences:
+                    return False
+                used_audiences.add((aud, t_idx))
+            teacher = self.sessions[s_idx].teacher
+            if teacher:
+                if (teacher, t_idx) in used_teachers:
+                    return False
+                used_teachers.add((teacher, t_idx))
+
+        return True
+
+    def cost(self, assignment: Assignment) -> int:
+        total = 0
+        busy: Dict[Tuple[str, str], List[int]] = defaultdict(list)  # (audience, day) -> slot indices
+
+        for s_idx in range(len(self.sessions)):
+            placement = assignment.get(s_idx)
+            if placement is None:
+                total += UNASSIGNED_PENALTY
+                continue
+            _, t_idx = placement
+            total += self.slot_penalty[s_idx][t_idx]
+            for aud in self.audiences[s_idx]:
+                busy[(aud, self.day_of(t_idx))].append(t_idx)
+
+        for slots in busy.values():
+            idle = max(slots) - min(slots) + 1 - len(slots)
+            total += GAP_PENALTY * idle
+
+        return total
+
+    def to_schedules(self, assignment: Assignment) -> Dict[str, Dict[str, List[SubjectSession | str]]]:
+        schedules: Dict[str, Dict[str, List[SubjectSession | str]]] = {}
+        for profile_name, sgrs in self.semigroups.items():
+            for sgr in sgrs:
+                schedules[f"{profile_name}_{sgr}"] = {day: [""] * len(HOUR_BLOCKS) for day in WEEK_DAYS}
+
+        for s_idx, placement in assignment.items():
+            if placement is None:
+                continue
+            r_idx, t_idx = placement
+            session = self.sessions[s_idx]
+            session.room = self.rooms[r_idx]
+            timeslot = self.timeslots[t_idx]
+            for aud in self.audiences[s_idx]:
+                schedules[aud][timeslot.day][HOUR_BLOCKS.index(timeslot.start_hour)] = session
+
+        return schedules
+
+    def save_assignment(self, assignment: Assignment, path: str):
+        data = {
+            "sessions": len(self.sessions),
+            "assignment": [
+                list(assignment[s_idx]) if assignment.get(s_idx) is not None else None
+                for s_idx in range(len(self.sessions))
+            ],
+        }
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+    def load_assignment(self, path: str) -> Assignment:
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data["sessions"] != len(self.sessions):
+            raise ValueError(f"{path} was saved for {data['sessions']} sessions, expected {len(self.sessions)}")
+        if len(data["assignment"]) != len(self.sessions):
+            raise ValueError(f"{path} has {len(data['assignment'])} placements, expected {len(self.sessions)}")
+
+        assignment: Assignment = {}
+        for s_idx, placement in enumerate(data["assignment"]):
+            if placement is not None and not self.is_valid_placement(placement):
+                raise ValueError(f"{path} has an invalid placement for session {s_idx}: {placement}")
+            assignment[s_idx] = tuple(placement) if placement is not None else None
+        return assignment
+
+
+def solve_neighborhood(problem: TimetableProblem, assignment: Assignment, free: Set[int],
+                       time_limit: float, workers: int = 1, seed: int = 0) -> Optional[Assignment]:
+    """Re-optimize the `free` sessions with CP-SAT while every other session stays where it is.
+
+    Returns the new placements of the free sessions, or None when no solution was found in time.
+    """
+    model = cp_model.CpModel()
+
+    # Step 1: Collect what the fixed part of the timetable already occupies
+    room_busy: Set[Tuple[int, int]] = set()
+    audience_busy: Set[Tuple[str, int]] = set()
+    teacher_busy: Set[Tuple[str, int]] = set()
+
+    for s_idx, placement in assignment.items():
+        if s_idx in free or placement is None:
+            continue
+        r_idx, t_idx = placement
+        room_busy.add((r_idx, t_idx))
+        audience_busy.update((aud, t_idx) for aud in problem.audiences[s_idx])
+        if problem.sessions[s_idx].teacher:
+            teacher_busy.add((problem.sessions[s_idx].teacher, t_idx))
+
+    # Step 2: Build variables only for placements compatible with the fixed part
+    assignment_vars = {}  # (session_idx, room_idx, timeslot_idx) -> BoolVar
+    unassigned_vars = {}  # session_idx -> BoolVar
+    room_slot_vars = defaultdict(list)
+    audience_slot_vars = defaultdict(list)
+    teacher_slot_vars = defaultdict(list)
+    objective = []
+
+    for s_idx in free:
+        teacher = problem.sessions[s_idx].teacher
+        options = []
+        for t_idx in range(len(problem.timeslots)):
+            if any((aud, t_idx) in audience_busy for aud in problem.audiences[s_idx]):
+                continue
+            if teacher and (teacher, t_idx) in teacher_busy:
+                continue
+            for r_idx in problem.eligible_rooms[s_idx]:
+                if (r_idx, t_idx) in room_busy:
+                    continue
+                var = model.NewBoolVar(f"s{s_idx}_r{r_idx}_t{t_idx}")
+                assignment_vars[(s_idx, r_idx, t_idx)] = var
+                options.append(var)
+                room_slot_vars[(r_idx, t_idx)].append(var)
+                for aud in problem.audiences[s_idx]:
+                    audience_slot_vars[(aud, t_idx)].append(var)
+                if teacher:
+                    teacher_slot_vars[(teacher, t_idx)].append(var)
+                objective.append(problem.slot_penalty[s_idx][t_idx] * var)
+
+        unassigned = model.NewBoolVar(f"unassigned_s{s_idx}")
+        unassigned_vars[s_idx] = unassigned
+        objective.append(UNASSIGNED_PENALTY * unassigned)
+
+        # Step 3: Each free session is placed exactly once (or explicitly left out)
+        model.AddExactlyOne(options + [unassigned])
+
+    # Step 4: No room, semigroup or teacher conflicts among the free sessions
+    for group in [*room_slot_vars.values(), *audience_slot_vars.values(), *teacher_slot_vars.values()]:
+        if len(group) > 1:
+            model.AddAtMostOne(group)
+
+    # Step 5: Idle blocks of every semigroup touched by the neighborhood
+    touched = {aud for s_idx in free for aud in problem.audiences[s_idx]}
+    slots_per_day = len(HOUR_BLOCKS)
+
+    for aud in touched:
+        for d_idx, day in enumerate(WEEK_DAYS):
+            day_slots = range(d_idx * slots_per_day, (d_idx + 1) * slots_per_day)
+            if not any(audience_slot_vars.get((aud, t_idx)) for t_idx in day_slots):
+                continue  # nothing can move on this day, its idle time is constant
+
+            occupied = [
+                1 if (aud, t_idx) in audience_busy else sum(audience_slot_vars.get((aud, t_idx), []))
+                for t_idx in day_slots
+            ]
+            for h in range(slots_per_day):
+                if isinstance(occupied[h], int) and occupied[h] == 1:
+                    continue
+                started = model.NewBoolVar(f"started_{aud}_{day}_{h}")
+                ended = model.NewBoolVar(f"ended_{aud}_{day}_{h}")
+                for k in range(h):
+                    model.Add(started >= occupied[k])
+                for k in range(h + 1, slots_per_day):
+                    model.Add(ended >= occupied[k])
+                idle = model.NewBoolVar(f"idle_{aud}_{day}_{h}")
+                model.Add(idle >= started + ended - occupied[h] - 1)
+                objective.append(GAP_PENALTY * idle)
+
+    # Step 6: Start from the incumbent placements; unplaced sessions are left unhinted, since
+    # hinting "unassigned" anchors the search on the trivial all-unassigned solution
+    for (s_idx, r_idx, t_idx), var in assignment_vars.items():
+        if assignment.get(s_idx) is not None:
+            model.AddHint(var, assignment[s_idx] == (r_idx, t_idx))
+    for s_idx, var in unassigned_vars.items():
+        if assignment.get(s_idx) is not None:
+            model.AddHint(var, False)
+
+    model.Minimize(sum(objective))
+
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = time_limit
+    solver.parameters.num_search_workers = workers
+    solver.parameters.random_seed = seed
+    status = solver.Solve(model)
+
+    if status != cp_model.OPTIMAL and status != cp_model.FEASIBLE:
+        return None
+
+    moves: Assignment = {s_idx: None for s_idx in free}
+    for (s_idx, r_idx, t_idx), var in assignment_vars.items():
+        if solver.Value(var) == 1:
+            moves[s_idx] = (r_idx, t_idx)
+    return moves
+
+
+@dataclass
+class LargeNeighborhoodSearch:
+    problem: TimetableProblem
+    time_limit: float = 60.0
+    parallel_subproblems: int = 4
+    subproblem_time_limit: float = 5.0
+    workers_per_subproblem: int = 1
+    max_free_sessions: int = 40
+    neighborhoods: Sequence[str] = NEIGHBORHOODS
+    seed: int = 0
+    history: List[Tuple[float, int]] = field(default_factory=list)  # (elapsed seconds, cost)
+
+    def neighborhood_key(self, kind: str, s_idx: int, assignment: Assignment) -> Optional[str]:
+        session = self.problem.sessions[s_idx]
+        if kind == "day":
+            placement = assignment.get(s_idx)
+            return self.problem.day_of(placement[1]) if placement is not None else None
+        if kind == "profile":
+            return session.profile
+        if kind == "room_type":
+            return session.type
+        if kind == "teacher":
+            return session.teacher
+        raise ValueError(f"Unknown neighborhood: {kind}")
+
+    def pick_neighborhood(self, assignment: Assignment, rng: random.Random, with_unplaced: bool = False) -> Set[int]:
+        # Unplaced sessions go first and count toward max_free_sessions
+        unplaced = []
+        if with_unplaced:
+            unplaced = [s_idx for s_idx in range(len(self.problem.sessions)) if assignment.get(s_idx) is None]
+            if len(unplaced) > self.max_free_sessions:
+                unplaced = rng.sample(unplaced, self.max_free_sessions)
+
+        kinds = list(self.neighborhoods)
+        rng.shuffle(kinds)
+        members: List[int] = []
+        for kind in kinds:
+            keys = {
+                s_idx: self.neighborhood_key(kind, s_idx, assignment)
+                for s_idx in range(len(self.problem.sessions))
+            }
+            values = sorted({key for key in keys.values() if key is not None})
+            if not values:
+                continue  # e.g. "day" when nothing is placed yet
+            value = rng.choice(values)
+            members = [s_idx for s_idx, key in keys.items() if key == value]
+            break
+
+        room_left = self.max_free_sessions - len(unplaced)
+        if len(members) > room_left:
+            members = rng.sample(members, room_left)
+
+        return set(members) | set(unplaced)
+
+    def run(self, initial: Optional[Assignment] = None) -> Assignment:
+        rng = random.Random(self.seed)
+        assignment = dict(initial) if initial is not None else self.problem.greedy()
+        if not self.problem.is_feasible(assignment):
+            raise ValueError("Initial timetable has room, semigroup or teacher conflicts")
+
+        best_cost = self.problem.cost(assignment)
+        start = time.monotonic()
+        deadline = start + self.time_limit
+        self.history = [(0.0, best_cost)]
+
+        with ThreadPoolExecutor(max_workers=self.parallel_subproblems) as executor:
+            while time.monotonic() < deadline:
+                budget = min(self.subproblem_time_limit, deadline - time.monotonic())
+                if budget <= 0:
+                    break
+
+                # Every subproblem starts from the same snapshot of the incumbent; only the first one
+                # of a round tries to place unplaced sessions, so the others don't clash with it
+                futures = [
+                    executor.submit(
+                        solve_neighborhood, self.problem, assignment,
+                        self.pick_neighborhood(assignment, rng, with_unplaced=(i == 0)),
+                        budget, self.workers_per_subproblem, rng.randrange(2 ** 31)
+                    )
+                    for i in range(self.parallel_subproblems)
+                ]
+
+                # Merge one by one; a move that clashes with an earlier accepted one is dropped
+                for future in futures:
+                    moves = future.result()
+                    if not moves:
+                        continue
+                    candidate = dict(assignment)
+                    candidate.update(moves)
+                    if not self.problem.is_feasible(candidate):
+                        continue
+                    cost = self.problem.cost(candidate)
+                    if cost <= best_cost:
+                        assignment, best_cost = candidate, cost
+
+                self.history.append((time.monotonic() - start, best_cost))
+
+        return assignment